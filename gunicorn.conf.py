@@ -0,0 +1,23 @@
+# Настройки gunicorn для запуска приложения в production: gunicorn main:app
+import multiprocessing
+import os
+
+from uvicorn_worker import UvicornWorker
+
+
+class UvloopWorker(UvicornWorker):
+    """uvicorn-воркер с явно заданными циклом событий uvloop и HTTP-парсером httptools"""
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# По одному воркеру на ядро
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = UvloopWorker
+
+
+def on_starting(server):
+    # Итоговое число воркеров (с учётом -w в командной строке) передаётся приложению через
+    # WEB_CONCURRENCY до запуска воркеров, чтобы пул каждого делил общий лимит DB_MAX_CONNECTIONS
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
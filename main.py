@@ -1,10 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
-from sqlalchemy import create_engine, Column, Integer, String, Float, Table, ForeignKey, and_
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session, joinedload
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import Column, Integer, String, Float, Table, ForeignKey, Index, bindparam, select, insert, update, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base, relationship, selectinload
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, List, Optional
+from decimal import Decimal
 from dotenv import load_dotenv
+import hashlib
+import orjson
 import os
+import warnings
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
@@ -12,16 +21,49 @@ load_dotenv()
 # Получаем параметры подключения к базе данных из переменных окружения
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-
-# Инициализация базы данных
-engine = create_engine(DATABASE_URL)
+# Параметры пула соединений. Общий лимит DB_MAX_CONNECTIONS (по умолчанию 80 при max_connections=100
+# в PostgreSQL) делится между воркерами gunicorn, каждый из которых держит собственный пул
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 80))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+_worker_connections = max(DB_MAX_CONNECTIONS // WEB_CONCURRENCY, 2)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", max(_worker_connections // 3, 1)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", max(_worker_connections - DB_POOL_SIZE, 0)))
+if DB_POOL_SIZE + DB_MAX_OVERFLOW > _worker_connections:
+    warnings.warn(
+        f"DB_POOL_SIZE + DB_MAX_OVERFLOW = {DB_POOL_SIZE + DB_MAX_OVERFLOW} превышает долю воркера "
+        f"({_worker_connections}) в DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS} при WEB_CONCURRENCY={WEB_CONCURRENCY}"
+    )
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# Размер пачки строк при потоковой выгрузке товаров
+EXPORT_BATCH_SIZE = 1000
+
+# Заголовок Cache-Control для списков товаров и категорий: клиент может переиспользовать ответ
+# несколько секунд, а затем перепроверить его через If-None-Match
+READ_CACHE_CONTROL = "private, max-age=5"
+
+
+# Инициализация базы данных (асинхронный драйвер, например postgresql+asyncpg://...)
+# pool_use_lifo=True переиспользует недавно освобождённые соединения, поэтому при низкой нагрузке
+# работает небольшой набор "горячих" соединений, а лишние закрываются по pool_recycle
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    pool_use_lifo=True,
+)
 Base = declarative_base()
 
 # Таблица связей для "многие ко многим"
+# Первичный ключ (item_id, category_id) покрывает поиск категорий товара,
+# дополнительный индекс (category_id, item_id) — поиск товаров категории
 item_category_association = Table(
     'item_category', Base.metadata,
-    Column('item_id', Integer, ForeignKey('items.id')),
-    Column('category_id', Integer, ForeignKey('categories.id'))
+    Column('item_id', Integer, ForeignKey('items.id'), primary_key=True),
+    Column('category_id', Integer, ForeignKey('categories.id'), primary_key=True),
+    Index('ix_item_category_category_id_item_id', 'category_id', 'item_id')
 )
 
 
@@ -31,7 +73,7 @@ class Item(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     description = Column(String, default=None)
-    price = Column(Float, nullable=False)
+    price = Column(Float, nullable=False, index=True)  # Индекс для фильтрации по диапазону цен
     categories = relationship("Category", secondary=item_category_association, back_populates="items")
 
 
@@ -43,23 +85,230 @@ class Category(Base):
     items = relationship("Item", secondary=item_category_association, back_populates="categories")
 
 
-# Создание таблиц
-Base.metadata.create_all(engine)
-
 # Настройка сессии для взаимодействия с БД
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: после commit атрибуты остаются загруженными и не требуют неявных запросов
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+# Ключ advisory-блокировки, под которой воркеры по очереди создают и обновляют схему
+SCHEMA_LOCK_ID = 815_001
+
+
+async def migrate_schema(conn):
+    """Приводит таблицы, созданные прежними версиями приложения, к текущей схеме.
+    create_all создаёт только отсутствующие таблицы и не изменяет существующие"""
+    has_primary_key = await conn.scalar(text(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = 'item_category'::regclass AND contype = 'p'"
+    ))
+    if not has_primary_key:
+        # Первичный ключ (item_id, category_id) нужен для ON CONFLICT в link_items_to_category;
+        # перед его добавлением удаляем неполные и повторяющиеся связи
+        await conn.execute(text("DELETE FROM item_category WHERE item_id IS NULL OR category_id IS NULL"))
+        await conn.execute(text(
+            "DELETE FROM item_category a USING item_category b "
+            "WHERE a.ctid < b.ctid AND a.item_id = b.item_id AND a.category_id = b.category_id"
+        ))
+        await conn.execute(text("ALTER TABLE item_category ADD PRIMARY KEY (item_id, category_id)"))
+
+    # Индексы, объявленные в моделях, но отсутствующие в уже существующих таблицах
+    def create_missing_indexes(sync_conn):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+    await conn.run_sync(create_missing_indexes)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Создание таблиц и обновление схемы существующей БД
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": SCHEMA_LOCK_ID})
+        await conn.run_sync(Base.metadata.create_all)
+        await migrate_schema(conn)
+    # Схема OpenAPI строится при первом обращении; собираем её заранее, чтобы не задерживать первый запрос
+    app.openapi()
+    yield
+    await engine.dispose()
+
+
+def orjson_default(obj: Any):
+    """Сериализует типы, которые orjson не поддерживает сам"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Тип {type(obj).__name__} не сериализуется в JSON")
+
+
+def dump_json(content: Any) -> bytes:
+    """Сериализует данные в JSON через orjson"""
+    return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastORJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый через orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+def cached_json_response(request: Request, content: Any) -> Response:
+    """Возвращает JSON-ответ с ETag по содержимому; если у клиента та же версия, отвечает 304 без тела"""
+    body = dump_json(content)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": READ_CACHE_CONTROL}
+
+    if_none_match = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 # Инициализация FastAPI
-app = FastAPI()
+# Ответы сериализуются через orjson; словари передаются в FastORJSONResponse напрямую,
+# поэтому response_model используется только для документации и повторно не валидирует данные
+app = FastAPI(default_response_class=FastORJSONResponse, lifespan=lifespan)
 
 
 # Зависимость для сессии
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def link_items_to_category(db: AsyncSession, category_id: int, item_ids: List[int]):
+    """Добавляет товары в категорию одним INSERT, пропуская уже существующие связи"""
+    if not item_ids:
+        return
+    stmt = pg_insert(item_category_association).values(
+        [{"item_id": item_id, "category_id": category_id} for item_id in item_ids]
+    ).on_conflict_do_nothing(index_elements=["item_id", "category_id"])
+    await db.execute(stmt)
+
+
+# Кэш id существующих категорий в памяти процесса. Категории не удаляются через API,
+# поэтому попавший в кэш id остаётся действительным; при промахе кэш дополняется из БД
+known_category_ids = set()
+
+
+async def category_exists(db: AsyncSession, category_id: int) -> bool:
+    """Проверяет существование категории, обращаясь к БД только при промахе кэша"""
+    if category_id in known_category_ids:
+        return True
+    if await db.scalar(select(Category.id).where(Category.id == category_id)) is None:
+        return False
+    known_category_ids.add(category_id)
+    return True
+
+
+async def count_existing_items(db: AsyncSession, item_ids: set) -> int:
+    """Возвращает количество товаров из списка, которые есть в БД"""
+    return await db.scalar(select(func.count()).select_from(Item).where(Item.id.in_(item_ids)))
+
+
+async def load_category(db: AsyncSession, category_id: int) -> Category:
+    """Загружает категорию вместе с товарами и их категориями за фиксированное число запросов"""
+    # Сбрасываем ранее загруженные объекты, чтобы связи были загружены заново после commit
+    db.expire_all()
+    result = await db.execute(
+        select(Category)
+        .options(selectinload(Category.items).selectinload(Item.categories))
+        .where(Category.id == category_id)
+    )
+    return result.scalar_one()
+
+
+def item_to_dict(item: Item) -> dict:
+    """Преобразует товар в словарь для ответа"""
+    return {
+        "id": item.id,
+        "name": item.name,
+        "description": item.description,
+        "price": item.price,
+        "categories": [category.name for category in item.categories]  # Преобразуем категории в список названий
+    }
+
+
+def category_to_dict(category: Category) -> dict:
+    """Преобразует категорию вместе с её товарами в словарь для ответа"""
+    return {
+        "id": category.id,
+        "name": category.name,
+        "items": [item_to_dict(item) for item in category.items]
+    }
+
+
+def build_items_filter(by_categories: bool, paginated: bool):
+    """Строит запрос товаров с фильтрацией по диапазону цен и, при необходимости, по категориям.
+    Значения фильтров не встраиваются в запрос, а передаются параметрами при выполнении"""
+    # Выбираются только колонки: строки читаются как словари, без создания ORM-объектов
+    stmt = (
+        select(Item.id, Item.name, Item.description, Item.price)
+        .where(Item.price.between(bindparam("min_price"), bindparam("max_price")))
+    )
+
+    # Фильтрация по категориям (EXISTS не размножает товары из нескольких категорий)
+    if by_categories:
+        stmt = stmt.where(Item.categories.any(Category.name.in_(bindparam("categories", expanding=True))))
+
+    # Сортировка по id нужна для стабильной пагинации
+    stmt = stmt.order_by(Item.id)
+    if paginated:
+        stmt = stmt.limit(bindparam("limit")).offset(bindparam("offset"))
+    return stmt
+
+
+# Запросы фильтрации товаров строятся один раз при загрузке модуля:
+# по одному на сочетание (фильтр по категориям, пагинация)
+ITEMS_FILTER_STMTS = {
+    (by_categories, paginated): build_items_filter(by_categories, paginated)
+    for by_categories in (False, True)
+    for paginated in (False, True)
+}
+
+
+# Названия категорий для набора товаров
+ITEM_CATEGORIES_STMT = (
+    select(item_category_association.c.item_id, Category.name)
+    .join(Category, Category.id == item_category_association.c.category_id)
+    .where(item_category_association.c.item_id.in_(bindparam("item_ids", expanding=True)))
+    .order_by(item_category_association.c.item_id, Category.id)  # Порядок как в get_categories
+)
+
+# Все категории вместе с товарами одним запросом; LEFT JOIN сохраняет категории без товаров
+CATEGORIES_WITH_ITEMS_STMT = (
+    select(
+        Category.id.label("category_id"),
+        Category.name.label("category_name"),
+        Item.id.label("item_id"),
+        Item.name.label("item_name"),
+        Item.description,
+        Item.price,
+    )
+    .select_from(Category)
+    .outerjoin(item_category_association, item_category_association.c.category_id == Category.id)
+    .outerjoin(Item, Item.id == item_category_association.c.item_id)
+    .order_by(Category.id, Item.id)
+)
+
+
+async def rows_to_items(db: AsyncSession, rows) -> List[dict]:
+    """Преобразует строки товаров в словари и дополняет их категориями одним запросом"""
+    items = {}
+    for row in rows:
+        items[row["id"]] = {**row, "categories": []}
+    if items:
+        result = await db.execute(ITEM_CATEGORIES_STMT, {"item_ids": list(items)})
+        for item_id, category_name in result:
+            items[item_id]["categories"].append(category_name)
+    return list(items.values())
+
+
+def items_filter_params(categories: Optional[List[str]], min_price: float, max_price: float) -> dict:
+    """Собирает параметры для запросов из ITEMS_FILTER_STMTS"""
+    params = {"min_price": min_price, "max_price": max_price}
+    if categories:
+        params["categories"] = categories
+    return params
 
 
 # Pydantic-схемы для валидации данных
@@ -99,129 +348,149 @@ class CategoryResponse(CategoryBase):
 
 # Маршруты для работы с товарами (items)
 @app.post("/items/", response_model=ItemResponse)
-def create_item(item: ItemCreate, db: Session = Depends(get_db)):
+async def create_item(item: ItemCreate, db: AsyncSession = Depends(get_db)):
     """Роут для создания товара"""
-    db_item = Item(name=item.name, description=item.description, price=item.price)
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return ItemResponse(
-        id=db_item.id,
-        name=db_item.name,
-        description=db_item.description,
-        price=db_item.price,
-        categories=[category.name for category in db_item.categories]  # Возвращаем список названий категорий
+    # INSERT ... RETURNING возвращает id за один запрос, без создания ORM-объекта
+    item_id = await db.scalar(
+        insert(Item).values(name=item.name, description=item.description, price=item.price).returning(Item.id)
     )
+    await db.commit()
+    return FastORJSONResponse({
+        "id": item_id,
+        "name": item.name,
+        "description": item.description,
+        "price": item.price,
+        "categories": []  # У нового товара ещё нет категорий
+    })
 
 
 @app.put("/items/{item_id}", response_model=ItemResponse)
-def update_item(item_id: int, item: ItemCreate, db: Session = Depends(get_db)):
-    """Роут для обновления товара"""
-    db_item = db.query(Item).get(item_id)
-    if not db_item:
+async def update_item(item_id: int, item: ItemCreate, db: AsyncSession = Depends(get_db)):
+    """Роут для обновления товара. Категории товара этим роутом не изменяются"""
+    values = {"name": item.name, "description": item.description, "price": item.price}
+    updated_id = await db.scalar(update(Item).where(Item.id == item_id).values(**values).returning(Item.id))
+    if updated_id is None:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
-    db_item.name = item.name
-    db_item.description = item.description
-    db_item.price = item.price
-    db.commit()
-    db.refresh(db_item)
-    return ItemResponse(
-        id=db_item.id,
-        name=db_item.name,
-        description=db_item.description,
-        price=db_item.price,
-        categories=[category.name for category in db_item.categories]  # Преобразуем категории в список названий
-    )
+    # Поля товара известны из запроса, из БД дочитываются только его текущие категории
+    response = (await rows_to_items(db, [{"id": item_id, **values}]))[0]
+    await db.commit()
+    return FastORJSONResponse(response)
 
 
 @app.delete("/items/{item_id}")
-def delete_item(item_id: int, db: Session = Depends(get_db)):
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_db)):
     """Роут для удаления товара"""
-    db_item = db.query(Item).get(item_id)
+    db_item = await db.get(Item, item_id)
     if not db_item:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
-    db.delete(db_item)
-    db.commit()
+    await db.delete(db_item)
+    await db.commit()
     return {"message": "Товар удален"}
 
 
 # Маршруты для работы с категориями (categories)
 @app.post("/categories/", response_model=CategoryResponse)
-def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
+async def create_category(category: CategoryCreate, db: AsyncSession = Depends(get_db)):
     """Роут для создания категории"""
-    existing_category = db.query(Category).filter_by(name=category.name).first()
-    if existing_category:
+    if await db.scalar(select(Category.id).where(Category.name == category.name)) is not None:
         raise HTTPException(status_code=400, detail="Категория с таким именем уже существует")
 
     db_category = Category(name=category.name)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
-    return db_category
+    await db.commit()
+    known_category_ids.add(db_category.id)
+    return FastORJSONResponse({"id": db_category.id, "name": db_category.name, "items": []})
 
 
 @app.get("/categories/", response_model=List[CategoryResponse])
-def get_categories(db: Session = Depends(get_db)):
+async def get_categories(request: Request, db: AsyncSession = Depends(get_db)):
     """Роут для получения всех категорий"""
-    categories = db.query(Category).all()
-    return [
-        CategoryResponse(
-            id=category.id,
-            name=category.name,
-            items=[ItemResponse(
-                id=item.id,
-                name=item.name,
-                description=item.description,
-                price=item.price,
-                categories=[cat.name for cat in item.categories]  # Сериализация категорий
-            ) for item in category.items]
-        )
-        for category in categories
-    ]
+    rows = (await db.execute(CATEGORIES_WITH_ITEMS_STMT)).all()
+
+    # Группируем строки в Python: каждый товар собирается один раз и переиспользуется во всех своих
+    # категориях, а список его категорий заполняется по мере обхода строк
+    categories = {}
+    items = {}
+    item_categories = defaultdict(list)
+    for row in rows:
+        category = categories.get(row.category_id)
+        if category is None:
+            category = categories[row.category_id] = {"id": row.category_id, "name": row.category_name, "items": []}
+        if row.item_id is None:
+            continue
+
+        item_categories[row.item_id].append(row.category_name)
+        item = items.get(row.item_id)
+        if item is None:
+            item = items[row.item_id] = {
+                "id": row.item_id,
+                "name": row.item_name,
+                "description": row.description,
+                "price": row.price,
+                "categories": item_categories[row.item_id]
+            }
+        category["items"].append(item)
+
+    return cached_json_response(request, list(categories.values()))
 
 
 @app.post("/categories/{category_id}/items/{item_id}", response_model=ItemResponse)
-def add_item_to_category(category_id: int, item_id: int, db: Session = Depends(get_db)):
+async def add_item_to_category(category_id: int, item_id: int, db: AsyncSession = Depends(get_db)):
     """Роут для добавления товаров в категорию"""
-    category = db.query(Category).get(category_id)
-    item = db.query(Item).get(item_id)
-
-    if not category:
+    if not await category_exists(db, category_id):
         raise HTTPException(status_code=404, detail="Категория не найдена")
+
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
-    # Проверяем, что товар еще не добавлен в категорию
-    if item not in category.items:
-        category.items.append(item)
-        db.commit()
-
-    return ItemResponse(
-        id=item.id,
-        name=item.name,
-        description=item.description,
-        price=item.price,
-        categories=[category.name for category in item.categories]  # Преобразуем категории в список названий
-    )
+    # Уже существующая связь пропускается на стороне БД
+    await link_items_to_category(db, category_id, [item_id])
+    await db.commit()
+
+    await db.refresh(item, attribute_names=["categories"])
+    return FastORJSONResponse(item_to_dict(item))
+
+
+@app.post("/categories/{category_id}/items", response_model=CategoryResponse)
+async def add_items_to_category(
+    category_id: int,
+    item_ids: List[int] = Body(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Роут для массового добавления товаров в категорию"""
+    if not await category_exists(db, category_id):
+        raise HTTPException(status_code=404, detail="Категория не найдена")
+
+    item_ids = set(item_ids)
+
+    # Проверяем, что все переданные товары существуют
+    if await count_existing_items(db, item_ids) != len(item_ids):
+        raise HTTPException(status_code=404, detail="Один или несколько товаров не найдены")
+
+    await link_items_to_category(db, category_id, list(item_ids))
+    await db.commit()
+
+    return FastORJSONResponse(category_to_dict(await load_category(db, category_id)))
 
 
 @app.put("/categories/{category_id}", response_model=CategoryResponse)
-def update_category(
+async def update_category(
     category_id: int,
     category: CategoryCreate,
     item_ids: Optional[List[int]] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Роут для обновления категории и её товаров"""
-    db_category = db.query(Category).get(category_id)
+    db_category = await db.get(Category, category_id)
     if not db_category:
         raise HTTPException(status_code=404, detail="Категория не найдена")
 
     # Проверяем, что новое имя категории не занято
-    existing_category = db.query(Category).filter(category.name == Category.name).first()
-    if existing_category and existing_category.id != category_id:
+    existing_category_id = await db.scalar(select(Category.id).where(Category.name == category.name))
+    if existing_category_id is not None and existing_category_id != category_id:
         raise HTTPException(status_code=400, detail="Категория с таким именем уже существует")
 
     # Обновляем имя категории
@@ -229,64 +498,63 @@ def update_category(
 
     # Если переданы item_ids, обновляем товары в категории
     if item_ids is not None:
-        items = db.query(Item).filter(Item.id.in_(item_ids)).all()
+        item_ids = set(item_ids)
 
         # Проверяем, что все переданные товары существуют
-        if len(items) != len(item_ids):
+        if await count_existing_items(db, item_ids) != len(item_ids):
             raise HTTPException(status_code=404, detail="Один или несколько товаров не найдены")
 
-        db_category.items = items
+        # Заменяем связи одним DELETE и одним INSERT вместо построчных запросов ORM
+        await db.execute(
+            item_category_association.delete().where(item_category_association.c.category_id == category_id)
+        )
+        await link_items_to_category(db, category_id, list(item_ids))
 
     # Применяем изменения
-    db.commit()
-    db.refresh(db_category)
-
-    return CategoryResponse(
-        id=db_category.id,
-        name=db_category.name,
-        items=[
-            ItemResponse(
-                id=item.id,
-                name=item.name,
-                description=item.description,
-                price=item.price,
-                categories=[cat.name for cat in item.categories]  # Преобразуем категории в список названий
-            )
-            for item in db_category.items
-        ]
-    )
+    await db.commit()
+    known_category_ids.add(category_id)
+
+    return FastORJSONResponse(category_to_dict(await load_category(db, category_id)))
 
 
 @app.get("/items", response_model=List[ItemResponse])
-def filter_items(
+async def filter_items(
+    request: Request,
     categories: Optional[List[str]] = Query(None),
     min_price: Optional[float] = Query(0),
     max_price: Optional[float] = Query(float('inf')),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Роут для фильтрации товаров по категориям и диапазону цен"""
-    query = db.query(Item).options(joinedload(Item.categories))  # Подгружаем связанные категории
-
-    # Фильтрация по категориям, если они указаны
-    if categories:
-        query = query.join(Item.categories).filter(Category.name.in_(categories))
-
-    # Фильтрация по диапазону цен
-    query = query.filter(and_(Item.price >= min_price, Item.price <= max_price))
+    """Роут для фильтрации товаров по категориям и диапазону цен с пагинацией"""
+    params = items_filter_params(categories, min_price, max_price)
+    params.update(limit=limit, offset=offset)
 
-    # Получаем результат
-    items = query.all()
+    # Получаем результат; если товаров нет, возвращается пустой список
+    result = await db.execute(ITEMS_FILTER_STMTS[bool(categories), True], params)
+    return cached_json_response(request, await rows_to_items(db, result.mappings()))
 
-    if not items:
-        raise HTTPException(status_code=404, detail="Товары не найдены")
 
-    return [
-        ItemResponse(
-            id=item.id,
-            name=item.name,
-            description=item.description,
-            price=item.price,
-            categories=[category.name for category in item.categories]  # Преобразуем категории в список названий
-        )
-        for item in items
-    ]
+@app.get("/items/export", response_model=List[ItemResponse])
+async def export_items(
+    categories: Optional[List[str]] = Query(None),
+    min_price: Optional[float] = Query(0),
+    max_price: Optional[float] = Query(float('inf'))
+):
+    """Роут для выгрузки всех подходящих товаров потоком, без загрузки выборки в память целиком"""
+    stmt = ITEMS_FILTER_STMTS[bool(categories), False]
+    params = items_filter_params(categories, min_price, max_price)
+
+    async def generate():
+        # Сессия открывается внутри генератора, так как ответ отправляется уже после выхода из роута
+        async with SessionLocal() as db:
+            result = await db.stream(stmt, params, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+            separator = b"["
+            async for batch in result.mappings().partitions():
+                items = await rows_to_items(db, batch)
+                yield separator + b",".join(dump_json(item) for item in items)
+                separator = b","
+            yield b"[]" if separator == b"[" else b"]"
+
+    return StreamingResponse(generate(), media_type="application/json")